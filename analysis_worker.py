@@ -0,0 +1,180 @@
+import os
+import asyncio
+import logging
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from openai import DefaultAsyncHttpxClient
+import httpx
+from app import app, db
+from models import AudioAnalysis
+from audio_processor import AudioProcessor
+from ric_agent import RICAgent
+
+# Whisper and GPT-4o calls are I/O-bound, so plain threads are enough to overlap them
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "4"))
+
+# Chunked transcriptions fan out, so allow several connections per worker
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", str(ANALYSIS_WORKERS * 4)))
+
+_executor = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix="ric-analysis")
+
+# All OpenAI traffic runs on one long-lived event loop so the shared connection pool
+# (and its warm TLS connections) can be reused across analyses
+_loop = asyncio.new_event_loop()
+threading.Thread(target=_loop.run_forever, name="ric-openai-loop", daemon=True).start()
+
+_http_client = DefaultAsyncHttpxClient(limits=httpx.Limits(
+    max_connections=OPENAI_MAX_CONNECTIONS,
+    max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+))
+
+@lru_cache(maxsize=None)
+def get_audio_processor():
+    """Shared AudioProcessor, created on first use"""
+    return AudioProcessor(http_client=_http_client)
+
+@lru_cache(maxsize=None)
+def get_ric_agent():
+    """Shared RICAgent, created on first use"""
+    return RICAgent(http_client=_http_client)
+
+def _run_coroutine(coro):
+    """Run a coroutine on the shared OpenAI event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+# Rows left in 'processing' longer than this (e.g. by a worker restart) are re-queued at startup
+ANALYSIS_STALE_MINUTES = int(os.environ.get("ANALYSIS_STALE_MINUTES", "60"))
+
+# Ids submitted to the executor but not yet picked up, so repeated dispatches don't pile up
+_queued_ids = set()
+_queued_lock = threading.Lock()
+
+def dispatch_pending_analyses():
+    """
+    Queue every uploaded analysis for background processing
+    
+    Rows stay 'uploaded' until a worker claims them, so anything lost from the
+    in-memory queue (e.g. on a restart) is picked up again by the next dispatch.
+    
+    Returns:
+        List of analysis ids that were queued by this call
+    """
+    pending = db.session.query(AudioAnalysis.id).filter_by(status='uploaded') \
+        .order_by(AudioAnalysis.upload_timestamp).all()
+    
+    queued = []
+    with _queued_lock:
+        for (analysis_id,) in pending:
+            if analysis_id not in _queued_ids:
+                _queued_ids.add(analysis_id)
+                queued.append(analysis_id)
+    
+    for analysis_id in queued:
+        _executor.submit(_run_analysis, analysis_id)
+    
+    if queued:
+        logging.info(f"Queued {len(queued)} analyses: {queued}")
+    return queued
+
+def requeue_stale_analyses():
+    """
+    Reset analyses stuck in 'processing' for longer than ANALYSIS_STALE_MINUTES
+    
+    Returns:
+        Number of analyses put back to 'uploaded'
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=ANALYSIS_STALE_MINUTES)
+    stale = AudioAnalysis.query.filter(
+        AudioAnalysis.status == 'processing',
+        db.or_(AudioAnalysis.processing_started_at.is_(None),
+               AudioAnalysis.processing_started_at < cutoff)
+    ).update({'status': 'uploaded', 'processing_started_at': None}, synchronize_session=False)
+    db.session.commit()
+    
+    if stale:
+        logging.warning(f"Re-queued {stale} analyses stuck in processing")
+    return stale
+
+def _run_analysis(analysis_id):
+    """Claim and process a single analysis inside its own application context"""
+    with app.app_context():
+        try:
+            # Conditional update so the same row is never processed twice
+            claimed = AudioAnalysis.query.filter_by(id=analysis_id, status='uploaded') \
+                .update({'status': 'processing', 'processing_started_at': datetime.utcnow()},
+                        synchronize_session=False)
+            db.session.commit()
+        finally:
+            with _queued_lock:
+                _queued_ids.discard(analysis_id)
+        if not claimed:
+            return
+        
+        analysis = db.session.get(AudioAnalysis, analysis_id)
+        if analysis is None:
+            logging.warning(f"Analysis {analysis_id} disappeared before processing")
+            return
+        try:
+            process_audio_analysis(analysis)
+        except Exception as e:
+            logging.error(f"Background analysis {analysis_id} failed: {str(e)}")
+
+def process_audio_analysis(analysis):
+    """
+    Process audio file and generate analysis
+    
+    The row is already marked 'processing' by _run_analysis, so results
+    are written in a single commit together with the final status.
+    """
+    try:
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], analysis.filename)
+        
+        audio_processor = get_audio_processor()
+        ric_agent = get_ric_agent()
+        
+        logging.info(f"Starting transcription and prosodic analysis for {analysis.filename}")
+        
+        # Steps 1 and 2: Transcribe audio and analyze prosody concurrently
+        transcription_result, prosody_result = _run_coroutine(
+            _transcribe_and_analyze_prosody(audio_processor, filepath, analysis.audio_sha256)
+        )
+        analysis.transcription_text = transcription_result['text']
+        analysis.set_transcription_data(transcription_result)
+        analysis.set_prosody_data(prosody_result)
+        
+        logging.info(f"Starting RIC feedback generation for {analysis.filename}")
+        
+        # Step 3: Generate RIC feedback with educational context
+        educational_context = analysis.get_educational_context()
+        combined_data = {
+            'transcription': transcription_result,
+            'prosody': prosody_result,
+            'educational_context': educational_context
+        }
+        
+        feedback = _run_coroutine(ric_agent.generate_educational_feedback(combined_data))
+        analysis.set_ric_feedback(feedback)
+        
+        # Mark as completed
+        analysis.status = 'completed'
+        analysis.analysis_timestamp = datetime.utcnow()
+        db.session.commit()
+        
+        logging.info(f"Analysis completed for {analysis.filename}")
+        
+    except Exception as e:
+        logging.error(f"Processing error for {analysis.filename}: {str(e)}")
+        db.session.rollback()
+        analysis.status = 'error'
+        analysis.error_message = str(e)
+        db.session.commit()
+        raise e
+
+async def _transcribe_and_analyze_prosody(audio_processor, filepath, audio_sha=None):
+    """Run transcription and prosody together; prosody only needs the file, not the transcript"""
+    return await asyncio.gather(
+        audio_processor.transcribe_audio(filepath, audio_sha),
+        asyncio.to_thread(audio_processor.analyze_prosody, filepath)
+    )
@@ -1,5 +1,6 @@
 import os
 import logging
+import orjson
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
@@ -23,6 +24,9 @@ app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:/
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
+    # JSON columns (transcription, prosody, feedback) go through orjson instead of stdlib json
+    "json_serializer": lambda obj: orjson.dumps(obj).decode(),
+    "json_deserializer": orjson.loads,
 }
 
 # Configure upload settings
@@ -42,3 +46,7 @@ with app.app_context():
     
     # Create all database tables
     db.create_all()
+    
+    # Put back analyses orphaned by a previous worker process
+    from analysis_worker import requeue_stale_analyses
+    requeue_stale_analyses()
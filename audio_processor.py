@@ -1,13 +1,30 @@
 import os
 import re
+import asyncio
+import hashlib
 import logging
-from openai import OpenAI
+import tempfile
+from collections import Counter
+from openai import AsyncOpenAI
+from cache import result_cache
+
+try:
+    import ahocorasick
+except ImportError:  # optional speed-up, fall back to a compiled regex
+    ahocorasick = None
+
+# Long recordings are split into chunks of at most this length and transcribed in parallel
+WHISPER_CHUNK_SECONDS = 600
+# Whisper rejects uploads over 25MB; leave headroom for container overhead
+WHISPER_MAX_UPLOAD_BYTES = 24 * 1024 * 1024
+# Whisper rejects very short audio, so a tail shorter than this joins the previous chunk
+WHISPER_MIN_CHUNK_SECONDS = 1.0
 
 class AudioProcessor:
     """Audio processing for transcription and basic analysis"""
     
-    def __init__(self):
-        self.openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    def __init__(self, http_client=None):
+        self.openai_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=http_client)
         
         # Spanish filler words for educational context
         self.spanish_fillers = [
@@ -15,61 +32,175 @@ class AudioProcessor:
             'entonces', 'pues', 'como', 'verdad', 'no', 'si', 'claro',
             'emmm', 'eeeh', 'aaa', 'eee'
         ]
+        
+        # Build the filler matcher once so transcripts are scanned in a single pass
+        if ahocorasick is not None:
+            self._filler_ac = ahocorasick.Automaton()
+            for filler in self.spanish_fillers:
+                self._filler_ac.add_word(filler.lower(), filler.lower())
+            self._filler_ac.make_automaton()
+        else:
+            self._filler_ac = None
+        # Longest alternatives first so e.g. 'eeeh' is tried before 'eh'
+        sorted_fillers = sorted(self.spanish_fillers, key=len, reverse=True)
+        self._filler_re = re.compile(r'\b(?:' + '|'.join(map(re.escape, sorted_fillers)) + r')\b')
+        self._pause_table = str.maketrans('', '', '.,;:!?')
+        # Words for WPM, counted without building a list of every word
+        self._word_re = re.compile(r'\w+', re.UNICODE)
     
-    def transcribe_audio(self, audio_file_path):
+    async def transcribe_audio(self, audio_file_path, audio_sha=None):
         """
         Transcribe audio using Whisper API with educational focus
         
         Args:
             audio_file_path: Path to audio file
+            audio_sha: SHA-256 of the file if already known, saves re-reading it
             
         Returns:
             Dict with transcription results including educational metrics
         """
         try:
+            # Identical audio always yields the same transcript, so key the cache on content
+            if audio_sha is None:
+                audio_sha = await asyncio.to_thread(self._audio_sha, audio_file_path)
+            cache_key = f"whisper:v2:{audio_sha}"
+            cached = await result_cache.get_json_async(cache_key)
+            if cached is not None:
+                logging.info(f"Using cached transcription for {audio_file_path}")
+                return cached
+            
             logging.info(f"Starting transcription of {audio_file_path}")
             
-            # Transcribe with Whisper
-            with open(audio_file_path, 'rb') as audio_file:
-                response = self.openai_client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="es",  # Spanish optimization
-                    response_format="verbose_json"
-                )
-            
-            text = response.text
-            segments = getattr(response, 'segments', [])
-            
-            # Convert segments to serializable format
-            serializable_segments = []
-            for segment in segments:
-                serializable_segments.append({
-                    'id': getattr(segment, 'id', 0),
-                    'start': getattr(segment, 'start', 0.0),
-                    'end': getattr(segment, 'end', 0.0),
-                    'text': getattr(segment, 'text', ''),
-                    'tokens': getattr(segment, 'tokens', []),
-                    'temperature': getattr(segment, 'temperature', 0.0),
-                    'avg_logprob': getattr(segment, 'avg_logprob', 0.0),
-                    'compression_ratio': getattr(segment, 'compression_ratio', 0.0),
-                    'no_speech_prob': getattr(segment, 'no_speech_prob', 0.0)
-                })
+            # Transcribe with Whisper, shifting each chunk's segments by its start offset
+            chunk_responses = await self._transcribe_in_chunks(audio_file_path)
+            text = ' '.join(response.text.strip() for response, _ in chunk_responses)
+            segments = []
+            for response, offset in chunk_responses:
+                for segment in getattr(response, 'segments', None) or []:
+                    segments.append(segment.model_copy(update={
+                        'id': len(segments),
+                        'start': segment.start + offset,
+                        'end': segment.end + offset
+                    }))
+            duration = sum(getattr(response, 'duration', 0) or 0 for response, _ in chunk_responses)
+            
+            # Convert segments to serializable format; only timing and text are used downstream,
+            # so token ids and decoder statistics are not persisted
+            serializable_segments = [
+                segment.model_dump(include={'start', 'end', 'text'}) for segment in segments
+            ]
             
             # Calculate educational metrics
             metrics = self._calculate_speech_metrics(text, segments)
             
-            return {
+            result = {
                 'text': text,
                 'segments': serializable_segments,
-                'duration': getattr(response, 'duration', 0),
+                'duration': duration,
                 **metrics
             }
+            await result_cache.set_json_async(cache_key, result)
+            return result
             
         except Exception as e:
             logging.error(f"Transcription error: {str(e)}")
             raise e
     
+    async def _transcribe_in_chunks(self, audio_file_path):
+        """
+        Transcribe a file, splitting long recordings into chunks sent to Whisper concurrently
+        
+        Returns:
+            List of (Whisper response, chunk start offset in seconds) in playback order
+        """
+        duration = await self._probe_duration(audio_file_path)
+        file_size = os.path.getsize(audio_file_path)
+        if not duration or not file_size:
+            return [(await self._request_transcription(audio_file_path), 0.0)]
+        
+        # Keep every chunk under the upload limit, assuming a roughly constant bitrate
+        chunk_seconds = min(WHISPER_CHUNK_SECONDS, duration * WHISPER_MAX_UPLOAD_BYTES / file_size)
+        if duration <= chunk_seconds:
+            return [(await self._request_transcription(audio_file_path), 0.0)]
+        
+        chunks = self._plan_chunks(duration, chunk_seconds)
+        if len(chunks) == 1:
+            return [(await self._request_transcription(audio_file_path), 0.0)]
+        offsets = [start for start, _ in chunks]
+        logging.info(f"Splitting {audio_file_path} into {len(chunks)} chunks of about {chunk_seconds:.0f}s")
+        
+        extension = os.path.splitext(audio_file_path)[1]
+        with tempfile.TemporaryDirectory(prefix='ric_chunks_') as chunk_dir:
+            chunk_paths = [os.path.join(chunk_dir, f"chunk_{i:03d}{extension}") for i in range(len(chunks))]
+            await asyncio.gather(*(
+                self._extract_chunk(audio_file_path, chunk_path, start, length)
+                for chunk_path, (start, length) in zip(chunk_paths, chunks)
+            ))
+            responses = await asyncio.gather(*(
+                self._request_transcription(chunk_path) for chunk_path in chunk_paths
+            ))
+        return list(zip(responses, offsets))
+    
+    def _plan_chunks(self, duration, chunk_seconds):
+        """
+        Split [0, duration) into (start, length) chunks of chunk_seconds
+        
+        The last chunk has length None and runs to the end of the file; a tail shorter
+        than WHISPER_MIN_CHUNK_SECONDS is folded into it rather than sent on its own.
+        """
+        starts = []
+        start = 0.0
+        while start < duration:
+            starts.append(start)
+            start += chunk_seconds
+        if len(starts) > 1 and duration - starts[-1] < WHISPER_MIN_CHUNK_SECONDS:
+            starts.pop()
+        lengths = [chunk_seconds] * (len(starts) - 1) + [None]
+        return list(zip(starts, lengths))
+    
+    async def _request_transcription(self, audio_file_path):
+        """Send a single file to the Whisper API"""
+        with open(audio_file_path, 'rb') as audio_file:
+            return await self.openai_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                language="es",  # Spanish optimization
+                response_format="verbose_json"
+            )
+    
+    async def _probe_duration(self, audio_file_path):
+        """Audio duration in seconds from ffprobe, or None when it cannot be determined"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1', audio_file_path,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+            )
+            stdout, _ = await process.communicate()
+            if process.returncode != 0:
+                return None
+            return float(stdout.decode().strip())
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not probe duration of {audio_file_path}: {str(e)}")
+            return None
+    
+    async def _extract_chunk(self, audio_file_path, chunk_path, start, length):
+        """Cut [start, start + length) seconds out of the file without re-encoding; length None reads to the end"""
+        duration_args = ['-t', f"{length:.3f}"] if length is not None else []
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg', '-v', 'error', '-y', '-ss', f"{start:.3f}", *duration_args,
+            '-i', audio_file_path, '-c', 'copy', chunk_path,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise Exception(f"ffmpeg could not split audio: {stderr.decode(errors='replace').strip()}")
+    
+    def _audio_sha(self, audio_file_path):
+        """SHA-256 of the audio file, streamed through OpenSSL by hashlib.file_digest"""
+        with open(audio_file_path, 'rb') as f:
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+    
     def analyze_prosody(self, audio_file_path):
         """
         Basic prosodic analysis (fallback when advanced tools unavailable)
@@ -138,9 +269,9 @@ class AudioProcessor:
     def _calculate_speech_metrics(self, text, segments):
         """Calculate speech metrics from transcription"""
         try:
-            # Word count and basic metrics
-            words = text.split()
-            word_count = len(words)
+            # Word count and basic metrics; counting \w+ runs ignores stray punctuation
+            # and avoids building a list of every word
+            word_count = sum(1 for _ in self._word_re.finditer(text))
             
             # Calculate speech rate (WPM)
             if segments and len(segments) > 0:
@@ -160,15 +291,7 @@ class AudioProcessor:
                 wpm = word_count  # rough estimate
             
             # Count filler words
-            fillers = {}
-            text_lower = text.lower()
-            
-            for filler in self.spanish_fillers:
-                # Use word boundaries to match whole words
-                pattern = r'\b' + re.escape(filler) + r'\b'
-                matches = len(re.findall(pattern, text_lower))
-                if matches > 0:
-                    fillers[filler] = matches
+            fillers = dict(self._count_fillers(text.lower()))
             
             # Analyze pauses (basic estimation)
             pauses = self._analyze_pauses_basic(text)
@@ -193,12 +316,32 @@ class AudioProcessor:
                 'pauses': {'count': 0, 'avg_ms': 0, 'total_ms': 0}
             }
     
+    def _count_fillers(self, text_lower):
+        """Count whole-word filler occurrences in a single scan of the text"""
+        if self._filler_ac is None:
+            return Counter(match.group(0) for match in self._filler_re.finditer(text_lower))
+        
+        counts = Counter()
+        text_length = len(text_lower)
+        for end, filler in self._filler_ac.iter(text_lower):
+            start = end - len(filler) + 1
+            # Only accept hits on word boundaries, like r'\b' in the regex fallback
+            if start > 0 and self._is_word_char(text_lower[start - 1]):
+                continue
+            if end + 1 < text_length and self._is_word_char(text_lower[end + 1]):
+                continue
+            counts[filler] += 1
+        return counts
+    
+    @staticmethod
+    def _is_word_char(char):
+        return char.isalnum() or char == '_'
+    
     def _analyze_pauses_basic(self, text):
         """Basic pause analysis from text patterns"""
         try:
             # Count punctuation that indicates pauses
-            pause_indicators = ['.', ',', ';', ':', '!', '?']
-            pause_count = sum(text.count(indicator) for indicator in pause_indicators)
+            pause_count = len(text) - len(text.translate(self._pause_table))
             
             # Estimate average pause duration based on punctuation type
             estimated_avg_pause = 500  # milliseconds
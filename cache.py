@@ -0,0 +1,68 @@
+import os
+import asyncio
+import orjson
+import logging
+
+try:
+    import redis
+except ImportError:  # caching is optional, everything still works without Redis
+    redis = None
+
+# Transcripts and feedback for identical inputs never change, so keep them for a month
+CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+# A slow or unreachable Redis must turn into a cache miss quickly, not stall analyses
+CACHE_SOCKET_TIMEOUT_SECONDS = float(os.environ.get("CACHE_SOCKET_TIMEOUT_SECONDS", "2"))
+
+class ResultCache:
+    """Redis-backed JSON cache for expensive Whisper and RIC results"""
+    
+    def __init__(self, url=None, ttl=CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.client = None
+        if url and redis is not None:
+            self.client = redis.Redis.from_url(
+                url,
+                socket_timeout=CACHE_SOCKET_TIMEOUT_SECONDS,
+                socket_connect_timeout=CACHE_SOCKET_TIMEOUT_SECONDS
+            )
+        elif url:
+            logging.warning("REDIS_URL is set but the redis package is not installed; caching disabled")
+    
+    def get_json(self, key):
+        """Return the cached value for key, or None on a miss or Redis failure"""
+        if self.client is None:
+            return None
+        try:
+            cached = self.client.get(key)
+        except Exception as e:
+            logging.warning(f"Cache read error for {key}: {str(e)}")
+            return None
+        if cached is None:
+            return None
+        try:
+            return orjson.loads(cached)
+        except orjson.JSONDecodeError:
+            return None
+    
+    def set_json(self, key, value):
+        """Store value under key with the configured TTL, ignoring Redis failures"""
+        if self.client is None:
+            return
+        try:
+            self.client.setex(key, self.ttl, orjson.dumps(value))
+        except Exception as e:
+            logging.warning(f"Cache write error for {key}: {str(e)}")
+    
+    async def get_json_async(self, key):
+        """get_json for coroutines: the blocking Redis call runs in a worker thread"""
+        if self.client is None:
+            return None
+        return await asyncio.to_thread(self.get_json, key)
+    
+    async def set_json_async(self, key, value):
+        """set_json for coroutines: the blocking Redis call runs in a worker thread"""
+        if self.client is None:
+            return
+        await asyncio.to_thread(self.set_json, key, value)
+
+result_cache = ResultCache(os.environ.get("REDIS_URL"))
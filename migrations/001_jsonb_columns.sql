@@ -0,0 +1,12 @@
+-- PostgreSQL only: convert the JSON text columns of existing databases to JSONB.
+-- New databases get these types from db.create_all(); SQLite needs no migration.
+BEGIN;
+
+ALTER TABLE audio_analysis
+    ALTER COLUMN transcription_data TYPE JSONB USING transcription_data::jsonb,
+    ALTER COLUMN prosody_data TYPE JSONB USING prosody_data::jsonb,
+    ALTER COLUMN ric_feedback TYPE JSONB USING ric_feedback::jsonb;
+
+CREATE INDEX IF NOT EXISTS ix_analysis_ric_feedback ON audio_analysis USING GIN (ric_feedback);
+
+COMMIT;
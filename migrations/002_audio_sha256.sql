@@ -0,0 +1,2 @@
+-- PostgreSQL and SQLite: store the upload's SHA-256 so transcription can reuse it as the cache key.
+ALTER TABLE audio_analysis ADD COLUMN audio_sha256 VARCHAR(64);
@@ -0,0 +1,3 @@
+-- PostgreSQL and SQLite: indexes for newest-first listings and status lookups.
+CREATE INDEX IF NOT EXISTS ix_analysis_upload_ts ON audio_analysis (upload_timestamp DESC);
+CREATE INDEX IF NOT EXISTS ix_analysis_status ON audio_analysis (status);
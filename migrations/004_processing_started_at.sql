@@ -0,0 +1,2 @@
+-- PostgreSQL and SQLite: record when a worker claimed the row so stale 'processing' rows can be re-queued.
+ALTER TABLE audio_analysis ADD COLUMN processing_started_at TIMESTAMP;
@@ -1,12 +1,16 @@
 from app import db
 from datetime import datetime
-import json
+from sqlalchemy.dialects.postgresql import JSONB
+
+# Native JSONB on PostgreSQL, JSON-encoded text everywhere else (e.g. SQLite in development)
+JSONType = db.JSON().with_variant(JSONB(), 'postgresql')
 
 class AudioAnalysis(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
     upload_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    audio_sha256 = db.Column(db.String(64))  # Content hash, computed while saving the upload
     analysis_timestamp = db.Column(db.DateTime)
     
     # Educational context
@@ -17,56 +21,47 @@ class AudioAnalysis(db.Model):
     
     # Transcription results
     transcription_text = db.Column(db.Text)
-    transcription_data = db.Column(db.Text)  # JSON string for detailed transcription
+    transcription_data = db.Column(JSONType)  # Detailed transcription
     
     # Prosodic analysis results
-    prosody_data = db.Column(db.Text)  # JSON string for prosodic metrics
+    prosody_data = db.Column(JSONType)  # Prosodic metrics
     
     # RIC AI feedback
-    ric_feedback = db.Column(db.Text)  # JSON string for AI-generated feedback
+    ric_feedback = db.Column(JSONType)  # AI-generated feedback
     
     # Analysis status
     status = db.Column(db.String(50), default='uploaded')  # uploaded, processing, completed, error
     error_message = db.Column(db.Text)
+    processing_started_at = db.Column(db.DateTime)  # Set when a worker claims the row
+    
+    __table_args__ = (
+        # Lets history/aggregation queries filter on feedback fields without a full scan
+        db.Index('ix_analysis_ric_feedback', 'ric_feedback', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
     
     def get_transcription_data(self):
-        """Parse transcription data from JSON"""
-        if self.transcription_data:
-            try:
-                return json.loads(self.transcription_data)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        """Get transcription data as a dictionary"""
+        return self.transcription_data or {}
     
     def set_transcription_data(self, data):
-        """Store transcription data as JSON"""
-        self.transcription_data = json.dumps(data)
+        """Store transcription data"""
+        self.transcription_data = data
     
     def get_prosody_data(self):
-        """Parse prosody data from JSON"""
-        if self.prosody_data:
-            try:
-                return json.loads(self.prosody_data)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        """Get prosody data as a dictionary"""
+        return self.prosody_data or {}
     
     def set_prosody_data(self, data):
-        """Store prosody data as JSON"""
-        self.prosody_data = json.dumps(data)
+        """Store prosody data"""
+        self.prosody_data = data
     
     def get_ric_feedback(self):
-        """Parse RIC feedback from JSON"""
-        if self.ric_feedback:
-            try:
-                return json.loads(self.ric_feedback)
-            except json.JSONDecodeError:
-                return {}
-        return {}
+        """Get RIC feedback as a dictionary"""
+        return self.ric_feedback or {}
     
     def set_ric_feedback(self, data):
-        """Store RIC feedback as JSON"""
-        self.ric_feedback = json.dumps(data)
+        """Store RIC feedback"""
+        self.ric_feedback = data
     
     def get_educational_context(self):
         """Get educational context as dictionary"""
@@ -76,3 +71,7 @@ class AudioAnalysis(db.Model):
             'lesson_topic': self.lesson_topic or 'Tema general',
             'additional_context': self.additional_context or ''
         }
+
+# Listings sort newest first and the dispatcher looks up rows by status
+db.Index('ix_analysis_upload_ts', AudioAnalysis.upload_timestamp.desc())
+db.Index('ix_analysis_status', AudioAnalysis.status)
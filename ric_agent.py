@@ -1,108 +1,25 @@
 import os
-import json
+import orjson
+import hashlib
 import logging
-from openai import OpenAI
+from collections import Counter
+from typing import Final
+from openai import AsyncOpenAI
+from cache import result_cache
 
-class RICAgent:
-    """RIC AI Agent - Educational feedback system using GPT-4 Turbo"""
-    
-    def __init__(self):
-        # The newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-        # Do not change this unless explicitly requested by the user
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        self.model = "gpt-4o"
-    
-    def generate_educational_feedback(self, analysis_data):
-        """
-        Generate comprehensive educational feedback based on transcription and prosodic analysis
-        
-        Args:
-            analysis_data: Dict containing transcription and prosody data
-            
-        Returns:
-            Dict with structured educational feedback
-        """
-        try:
-            # Prepare the analysis summary for the AI
-            transcription = analysis_data.get('transcription', {})
-            prosody = analysis_data.get('prosody', {})
-            educational_context = analysis_data.get('educational_context', {})
-            
-            analysis_summary = self._prepare_analysis_summary(transcription, prosody, educational_context)
-            
-            # Generate comprehensive feedback
-            feedback_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self._get_system_prompt()
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Analyze this classroom teaching session and provide educational feedback:\n\n{analysis_summary}"
-                    }
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7
-            )
-            
-            content = feedback_response.choices[0].message.content
-            if content is None:
-                raise Exception("Empty response from AI model")
-            feedback = json.loads(content)
-            
-            # Add metadata
-            feedback['analysis_timestamp'] = analysis_data.get('timestamp')
-            feedback['ric_version'] = '1.0'
-            
-            return feedback
-            
-        except Exception as e:
-            logging.error(f"RIC Agent error: {str(e)}")
-            return self._get_error_feedback(str(e))
-    
-    def _prepare_analysis_summary(self, transcription, prosody, educational_context=None):
-        """Prepare a summary of the analysis data for the AI"""
-        summary = []
-        
-        # Educational context summary
-        if educational_context:
-            summary.append("=== CONTEXTO EDUCATIVO ===")
-            summary.append(f"Materia: {educational_context.get('subject', 'No especificado')}")
-            summary.append(f"Grado: {educational_context.get('grade_level', 'No especificado')}")
-            summary.append(f"Tema de la clase: {educational_context.get('lesson_topic', 'No especificado')}")
-            if educational_context.get('additional_context'):
-                summary.append(f"Contexto adicional: {educational_context.get('additional_context')}")
-            summary.append("")
-        
-        # Transcription summary
-        if transcription:
-            summary.append("=== ANÁLISIS DE TRANSCRIPCIÓN ===")
-            summary.append(f"Texto: {transcription.get('text', 'N/A')[:500]}...")
-            summary.append(f"Velocidad de habla: {transcription.get('wpm', 0)} palabras por minuto")
-            summary.append(f"Total de pausas: {transcription.get('pauses', {}).get('count', 0)}")
-            summary.append(f"Duración promedio de pausas: {transcription.get('pauses', {}).get('avg_ms', 0)}ms")
-            
-            fillers = transcription.get('fillers', {})
-            if fillers:
-                summary.append(f"Muletillas detectadas: {dict(list(fillers.items())[:5])}")
-        
-        # Prosodic summary
-        if prosody:
-            summary.append("\n=== ANÁLISIS PROSÓDICO ===")
-            summary.append(f"Tono promedio: {prosody.get('f0_mean_hz', 0):.1f} Hz")
-            summary.append(f"Rango de tono: {prosody.get('f0_range_hz', 0):.1f} Hz")
-            summary.append(f"Variabilidad del tono (Jitter): {prosody.get('jitter_local', 0):.2f}%")
-            summary.append(f"Estabilidad del volumen (Shimmer): {prosody.get('shimmer_local', 0):.2f}%")
-            summary.append(f"Volumen promedio: {prosody.get('intensity_mean_db', 0):.1f} dB")
-            summary.append(f"Rango de volumen: {prosody.get('intensity_range_db', 0):.1f} dB")
-        
-        return "\n".join(summary)
-    
-    def _get_system_prompt(self):
-        """Get the system prompt for RIC educational feedback"""
-        return """
+# Sessions with more transcribed words than this go straight to the fallback model. The summary
+# only carries a 500-character excerpt, so length is measured on the transcript itself:
+# 4500 words is about 30 minutes of teaching at the 120-160 WPM the prompt treats as optimal.
+ESCALATION_WORD_COUNT = 4500
+
+# Sections the analysis page renders; feedback missing any of them is retried on the fallback model
+REQUIRED_FEEDBACK_KEYS = ('overall_score', 'summary', 'strengths', 'areas_for_improvement',
+                          'detailed_analysis', 'key_metrics', 'action_plan')
+REQUIRED_ANALYSIS_SECTIONS = ('speech_delivery', 'engagement_pace', 'vocal_variety',
+                              'professional_communication', 'grade_level_appropriateness')
+
+# Identical on every request, so OpenAI's automatic prompt caching can reuse it
+_SYSTEM_PROMPT: Final[str] = """
 Eres RIC (Reflective Instruction Coach), un consultor educativo experto especializado en analizar la entrega de enseñanza y proporcionar retroalimentación práctica a educadores. Tu rol es ayudar a los maestros a mejorar la efectividad de su comunicación en el aula.
 
 ÁREAS DE ANÁLISIS:
@@ -184,6 +101,143 @@ IMPORTANTE:
 - Si detectas lenguaje muy técnico para el grado, sugiere analogías o simplificaciones específicas
 - Si el nivel es muy simple para el grado, sugiere cómo elevar el nivel académico apropiadamente
 """
+
+class RICAgent:
+    """RIC AI Agent - Educational feedback system using GPT-4 Turbo"""
+    
+    def __init__(self, http_client=None):
+        self.client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=http_client)
+        # The fixed-schema JSON task fits the cheaper model; gpt-4o is kept for long or invalid cases
+        self.model = os.environ.get("RIC_MODEL", "gpt-4o-mini")
+        self.fallback_model = os.environ.get("RIC_FALLBACK_MODEL", "gpt-4o")
+    
+    async def generate_educational_feedback(self, analysis_data):
+        """
+        Generate comprehensive educational feedback based on transcription and prosodic analysis
+        
+        Args:
+            analysis_data: Dict containing transcription and prosody data
+            
+        Returns:
+            Dict with structured educational feedback
+        """
+        try:
+            # Prepare the analysis summary for the AI
+            transcription = analysis_data.get('transcription', {})
+            prosody = analysis_data.get('prosody', {})
+            educational_context = analysis_data.get('educational_context', {})
+            
+            analysis_summary = self._prepare_analysis_summary(transcription, prosody, educational_context)
+            
+            # The same summary sent to the same model gets reused instead of re-generated
+            summary_hash = hashlib.sha256(
+                f"{self.model}\n{self.fallback_model}\n{analysis_summary}".encode('utf-8')
+            ).hexdigest()
+            cache_key = f"ric:v1:{summary_hash}"
+            feedback = await result_cache.get_json_async(cache_key)
+            if feedback is None:
+                feedback = await self._generate_with_fallback(analysis_summary, transcription.get('word_count', 0))
+                await result_cache.set_json_async(cache_key, feedback)
+            
+            # Add metadata
+            feedback['analysis_timestamp'] = analysis_data.get('timestamp')
+            feedback['ric_version'] = '1.0'
+            
+            return feedback
+            
+        except Exception as e:
+            logging.error(f"RIC Agent error: {str(e)}")
+            return self._get_error_feedback(str(e))
+    
+    async def _generate_with_fallback(self, analysis_summary, word_count):
+        """Generate feedback with the primary model, escalating to the fallback model when needed"""
+        model = self.model
+        if word_count > ESCALATION_WORD_COUNT:
+            model = self.fallback_model
+        if model == self.fallback_model:
+            return await self._request_feedback(analysis_summary, model)
+        
+        try:
+            feedback = await self._request_feedback(analysis_summary, model)
+            if self._is_valid_feedback(feedback):
+                return feedback
+            logging.warning(f"{model} feedback failed schema validation, retrying with {self.fallback_model}")
+        except orjson.JSONDecodeError:
+            logging.warning(f"{model} returned invalid JSON, retrying with {self.fallback_model}")
+        
+        return await self._request_feedback(analysis_summary, self.fallback_model)
+    
+    def _is_valid_feedback(self, feedback):
+        """Check that feedback has every section the analysis page renders"""
+        if not isinstance(feedback, dict) or not all(key in feedback for key in REQUIRED_FEEDBACK_KEYS):
+            return False
+        detailed_analysis = feedback.get('detailed_analysis')
+        if not isinstance(detailed_analysis, dict):
+            return False
+        return all(isinstance(detailed_analysis.get(section), dict) for section in REQUIRED_ANALYSIS_SECTIONS)
+    
+    async def _request_feedback(self, analysis_summary, model):
+        """Ask the given model for feedback on a prepared analysis summary"""
+        feedback_response = await self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": _SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": f"Analyze this classroom teaching session and provide educational feedback:\n\n{analysis_summary}"
+                }
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.7
+        )
+        
+        content = feedback_response.choices[0].message.content
+        if content is None:
+            raise Exception("Empty response from AI model")
+        return orjson.loads(content)
+    
+    def _prepare_analysis_summary(self, transcription, prosody, educational_context=None):
+        """Prepare a summary of the analysis data for the AI"""
+        summary = []
+        
+        # Educational context summary
+        if educational_context:
+            summary.append("=== CONTEXTO EDUCATIVO ===")
+            summary.append(f"Materia: {educational_context.get('subject', 'No especificado')}")
+            summary.append(f"Grado: {educational_context.get('grade_level', 'No especificado')}")
+            summary.append(f"Tema de la clase: {educational_context.get('lesson_topic', 'No especificado')}")
+            if educational_context.get('additional_context'):
+                summary.append(f"Contexto adicional: {educational_context.get('additional_context')}")
+            summary.append("")
+        
+        # Transcription summary
+        if transcription:
+            summary.append("=== ANÁLISIS DE TRANSCRIPCIÓN ===")
+            summary.append(f"Texto: {transcription.get('text', 'N/A')[:500]}...")
+            summary.append(f"Total de palabras: {transcription.get('word_count', 0)}")
+            summary.append(f"Velocidad de habla: {transcription.get('wpm', 0)} palabras por minuto")
+            summary.append(f"Total de pausas: {transcription.get('pauses', {}).get('count', 0)}")
+            summary.append(f"Duración promedio de pausas: {transcription.get('pauses', {}).get('avg_ms', 0)}ms")
+            
+            fillers = transcription.get('fillers', {})
+            if fillers:
+                top_fillers = Counter(fillers).most_common(5)
+                summary.append(f"Muletillas más frecuentes: {', '.join(f'{filler} ({count})' for filler, count in top_fillers)}")
+        
+        # Prosodic summary
+        if prosody:
+            summary.append("\n=== ANÁLISIS PROSÓDICO ===")
+            summary.append(f"Tono promedio: {prosody.get('f0_mean_hz', 0):.1f} Hz")
+            summary.append(f"Rango de tono: {prosody.get('f0_range_hz', 0):.1f} Hz")
+            summary.append(f"Variabilidad del tono (Jitter): {prosody.get('jitter_local', 0):.2f}%")
+            summary.append(f"Estabilidad del volumen (Shimmer): {prosody.get('shimmer_local', 0):.2f}%")
+            summary.append(f"Volumen promedio: {prosody.get('intensity_mean_db', 0):.1f} dB")
+            summary.append(f"Rango de volumen: {prosody.get('intensity_range_db', 0):.1f} dB")
+        
+        return "\n".join(summary)
     
     def _get_error_feedback(self, error_message):
         """Return error feedback structure"""
@@ -1,23 +1,58 @@
 import os
+import hashlib
 import logging
 from datetime import datetime
 from flask import render_template, request, jsonify, flash, redirect, url_for, send_file
 from werkzeug.utils import secure_filename
 from app import app, db
 from models import AudioAnalysis
-from audio_processor import AudioProcessor
-from ric_agent import RICAgent
-import json
+from analysis_worker import dispatch_pending_analyses
 
-ALLOWED_EXTENSIONS = {'mp3', 'wav', 'm4a', 'ogg', 'flac'}
+ALLOWED_EXTENSIONS = frozenset({'mp3', 'wav', 'm4a', 'ogg', 'flac'})
+
+HISTORY_PAGE_SIZE = 20
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return bool(filename) and '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def analysis_listing_query():
+    """Newest-first listing rows: metadata and overall score only, none of the large JSON payloads"""
+    return AudioAnalysis.query.with_entities(
+        AudioAnalysis.id,
+        AudioAnalysis.original_filename,
+        AudioAnalysis.upload_timestamp,
+        AudioAnalysis.analysis_timestamp,
+        AudioAnalysis.status,
+        AudioAnalysis.subject,
+        AudioAnalysis.grade_level,
+        AudioAnalysis.lesson_topic,
+        AudioAnalysis.ric_feedback['overall_score'].as_float().label('overall_score')
+    ).order_by(AudioAnalysis.upload_timestamp.desc())
+
+def save_upload(file, filepath):
+    """Stream an uploaded file to disk in fixed-size chunks, returning its SHA-256"""
+    digest = hashlib.sha256()
+    with open(filepath, 'wb') as out:
+        for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+def start_pending_analyses():
+    """Hand queued analyses to the background workers, returning False if dispatch failed"""
+    try:
+        dispatch_pending_analyses()
+        return True
+    except Exception as e:
+        logging.error(f"Analysis dispatch error: {str(e)}")
+        db.session.rollback()
+        return False
 
 @app.route('/')
 def index():
     """Main page with upload interface"""
-    recent_analyses = AudioAnalysis.query.order_by(AudioAnalysis.upload_timestamp.desc()).limit(5).all()
+    recent_analyses = analysis_listing_query().limit(5).all()
     return render_template('index.html', recent_analyses=recent_analyses)
 
 @app.route('/upload', methods=['POST'])
@@ -29,24 +64,20 @@ def upload_audio():
             return redirect(url_for('index'))
         
         file = request.files['audio_file']
-        if file.filename == '':
+        if not file.filename:
             flash('No file selected', 'error')
             return redirect(url_for('index'))
         
-        if file.filename is None or not allowed_file(file.filename):
+        if not allowed_file(file.filename):
             flash('Invalid file format. Please upload MP3, WAV, M4A, OGG, or FLAC files.', 'error')
             return redirect(url_for('index'))
         
         # Save the file
-        if file.filename is None:
-            flash('Invalid filename', 'error')
-            return redirect(url_for('index'))
-        
         filename = secure_filename(file.filename)
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"{timestamp}_{filename}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        audio_sha256 = save_upload(file, filepath)
         
         # Get educational context from form
         subject = request.form.get('subject', '').strip()
@@ -58,6 +89,7 @@ def upload_audio():
         analysis = AudioAnalysis()
         analysis.filename = filename
         analysis.original_filename = file.filename
+        analysis.audio_sha256 = audio_sha256
         analysis.subject = subject
         analysis.grade_level = grade_level
         analysis.lesson_topic = lesson_topic
@@ -66,8 +98,14 @@ def upload_audio():
         db.session.add(analysis)
         db.session.commit()
         
-        flash('File uploaded successfully! Analysis is starting...', 'success')
-        return redirect(url_for('analyze', analysis_id=analysis.id))
+        analysis_id = analysis.id
+        
+        # Processing runs in the background; the analysis page polls for status
+        if start_pending_analyses():
+            flash('File uploaded successfully! Analysis is starting...', 'success')
+        else:
+            flash('File uploaded, but the analysis could not be started. Reload the page to retry.', 'warning')
+        return redirect(url_for('analyze', analysis_id=analysis_id))
         
     except Exception as e:
         logging.error(f"Upload error: {str(e)}")
@@ -76,18 +114,13 @@ def upload_audio():
 
 @app.route('/analyze/<int:analysis_id>')
 def analyze(analysis_id):
-    """Display analysis page and trigger processing"""
+    """Display analysis page; processing status is polled from the client"""
     analysis = AudioAnalysis.query.get_or_404(analysis_id)
     
-    # If not yet processed, start processing
+    # Retry rows whose dispatch failed at upload time
     if analysis.status == 'uploaded':
-        try:
-            process_audio_analysis(analysis)
-        except Exception as e:
-            logging.error(f"Analysis error: {str(e)}")
-            analysis.status = 'error'
-            analysis.error_message = str(e)
-            db.session.commit()
+        start_pending_analyses()
+        analysis = AudioAnalysis.query.get_or_404(analysis_id)
     
     return render_template('analysis.html', analysis=analysis)
 
@@ -95,6 +128,11 @@ def analyze(analysis_id):
 def get_analysis_status(analysis_id):
     """Get current analysis status via API"""
     analysis = AudioAnalysis.query.get_or_404(analysis_id)
+    
+    # Polling pages keep re-queuing rows lost by a failed dispatch or a restart
+    if analysis.status == 'uploaded':
+        start_pending_analyses()
+    
     return jsonify({
         'status': analysis.status,
         'error_message': analysis.error_message
@@ -117,59 +155,13 @@ def get_analysis_results(analysis_id):
 @app.route('/history')
 def history():
     """View analysis history"""
-    analyses = AudioAnalysis.query.order_by(AudioAnalysis.upload_timestamp.desc()).all()
-    return render_template('history.html', analyses=analyses)
-
-def process_audio_analysis(analysis):
-    """Process audio file and generate analysis"""
-    try:
-        analysis.status = 'processing'
-        db.session.commit()
-        
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], analysis.filename)
-        
-        # Initialize processors
-        audio_processor = AudioProcessor()
-        ric_agent = RICAgent()
-        
-        logging.info(f"Starting transcription for {analysis.filename}")
-        
-        # Step 1: Transcribe audio
-        transcription_result = audio_processor.transcribe_audio(filepath)
-        analysis.transcription_text = transcription_result['text']
-        analysis.set_transcription_data(transcription_result)
-        db.session.commit()
-        
-        logging.info(f"Starting prosodic analysis for {analysis.filename}")
-        
-        # Step 2: Analyze prosody
-        prosody_result = audio_processor.analyze_prosody(filepath)
-        analysis.set_prosody_data(prosody_result)
-        db.session.commit()
-        
-        logging.info(f"Starting RIC feedback generation for {analysis.filename}")
-        
-        # Step 3: Generate RIC feedback with educational context
-        educational_context = analysis.get_educational_context()
-        combined_data = {
-            'transcription': transcription_result,
-            'prosody': prosody_result,
-            'educational_context': educational_context
-        }
-        
-        feedback = ric_agent.generate_educational_feedback(combined_data)
-        analysis.set_ric_feedback(feedback)
-        
-        # Mark as completed
-        analysis.status = 'completed'
-        analysis.analysis_timestamp = datetime.utcnow()
-        db.session.commit()
-        
-        logging.info(f"Analysis completed for {analysis.filename}")
-        
-    except Exception as e:
-        logging.error(f"Processing error for {analysis.filename}: {str(e)}")
-        analysis.status = 'error'
-        analysis.error_message = str(e)
-        db.session.commit()
-        raise e
+    page = request.args.get('page', 1, type=int)
+    pagination = analysis_listing_query().paginate(page=page, per_page=HISTORY_PAGE_SIZE, error_out=False)
+    
+    # Overview counts come from the database instead of loading every row
+    status_counts = dict(
+        db.session.query(AudioAnalysis.status, db.func.count(AudioAnalysis.id))
+        .group_by(AudioAnalysis.status).all()
+    )
+    return render_template('history.html', analyses=pagination.items, pagination=pagination,
+                           status_counts=status_counts)
@@ -52,10 +52,10 @@ class RICApp {
     }
 
     setupAutoRefresh() {
-        // Auto-refresh for processing status
-        const analysisStatus = document.querySelector('.badge');
-        if (analysisStatus && analysisStatus.textContent.includes('Procesando')) {
-            this.startStatusPolling();
+        // Auto-refresh while the analysis is queued or processing
+        const statusBadge = document.querySelector('.status-badge[data-status]');
+        if (statusBadge && ['uploaded', 'processing'].includes(statusBadge.dataset.status)) {
+            this.startStatusPolling(statusBadge.dataset.status);
         }
     }
 
@@ -225,31 +225,35 @@ class RICApp {
         }, 5000);
     }
 
-    startStatusPolling() {
+    startStatusPolling(initialStatus) {
         const currentUrl = window.location.pathname;
         const analysisId = currentUrl.split('/').pop();
         
         if (!analysisId || isNaN(analysisId)) return;
+        
+        // Start at 5 seconds and back off to once a minute; queued and long
+        // chunked recordings can take well over ten minutes to finish
+        let delay = 5000;
+        const maxDelay = 60000;
 
-        const pollInterval = setInterval(async () => {
+        const poll = async () => {
             try {
                 const response = await fetch(`/api/analysis/${analysisId}/status`);
                 const data = await response.json();
-
-                if (data.status === 'completed' || data.status === 'error') {
-                    clearInterval(pollInterval);
+                
+                // Reload to show results, errors or the processing state
+                if (data.status !== initialStatus) {
                     window.location.reload();
+                    return;
                 }
             } catch (error) {
                 console.error('Status polling error:', error);
-                clearInterval(pollInterval);
             }
-        }, 5000); // Poll every 5 seconds
+            delay = Math.min(delay * 1.5, maxDelay);
+            setTimeout(poll, delay);
+        };
 
-        // Stop polling after 10 minutes to prevent infinite requests
-        setTimeout(() => {
-            clearInterval(pollInterval);
-        }, 600000);
+        setTimeout(poll, delay);
     }
 }
 